@@ -25,9 +25,12 @@ Temporal clustering
 """
 
 from decorator import decorator
+from joblib import Parallel, cpu_count, delayed
+from numba import jit
 
 import numpy as np
 import scipy
+import scipy.fftpack
 import scipy.signal
 import scipy.ndimage
 
@@ -35,12 +38,22 @@ import sklearn
 import sklearn.cluster
 import sklearn.feature_extraction
 import sklearn.neighbors
+import sklearn.preprocessing
 
 from ._cache import cache
+from . import core
 from . import util
 from .filters import diagonal_filter
 from .util.exceptions import ParameterError
 
+try:
+    from functools import lru_cache
+except ImportError:  # pragma: no cover
+    # Python 2 has no lru_cache, so we skip memoization there
+    def lru_cache(maxsize=128):
+        '''No-op stand-in for `functools.lru_cache`'''
+        return lambda function: function
+
 __all__ = ['recurrence_matrix',
            'recurrence_to_lag',
            'lag_to_recurrence',
@@ -49,11 +62,28 @@ __all__ = ['recurrence_matrix',
            'subsegment',
            'path_enhance']
 
+# Boundary modes of scipy.ndimage, and their equivalents in np.pad
+__PAD_MODES = {'reflect': 'symmetric',
+               'mirror': 'reflect',
+               'nearest': 'edge',
+               'wrap': 'wrap',
+               'constant': 'constant'}
+
+# Tree-based neighbor search only pays off over brute force
+# for long inputs in low dimension
+__TREE_MIN_FRAMES = 2000
+__TREE_MAX_DIM = 8
+
+# Frequency-domain convolution pays off over direct convolution when
+# the kernel has more than this many taps per bit of log2(R.size)
+__FFT_MIN_TAPS_RATIO = 4
+
 
 @cache(level=30)
 def recurrence_matrix(data, k=None, width=1, metric='euclidean',
                       sym=False, sparse=False, mode='connectivity',
-                      bandwidth=None, self=False, axis=-1):
+                      bandwidth=None, self=False, axis=-1, dtype=np.float32,
+                      _strategy='auto'):
     '''Compute a recurrence matrix from a data matrix.
 
     `rec[i, j]` is non-zero if (`data[:, i]`, `data[:, j]`) are
@@ -95,6 +125,11 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
 
         See `sklearn.neighbors.NearestNeighbors` for details.
 
+        If `metric='cosine'` and tree-based search is used (see Notes),
+        neighbors are found by euclidean distance on L2-normalized data,
+        which produces the same ranking.
+        If any frame has zero norm, brute-force search is used instead.
+
     sym : bool [scalar]
         set `sym=True` to only link mutual nearest-neighbors
 
@@ -129,11 +164,25 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
         The axis along which to compute recurrence.
         By default, the last index (-1) is taken.
 
+    dtype : np.dtype
+        The data type of the output in ``mode='distance'`` and
+        ``mode='affinity'``.
+        Single precision is used by default, which halves the memory
+        footprint of downstream processing (e.g., `path_enhance`).
+
+        Connectivity matrices are always boolean.
+
     Returns
     -------
     rec : np.ndarray or scipy.sparse.csr_matrix, [shape=(t, t)]
         Recurrence matrix
 
+        If ``mode='connectivity'``, `rec` is boolean.
+        Otherwise, `rec` has data type `dtype` (`np.float32` by default).
+
+        .. note:: In librosa 0.6 and earlier, distance and affinity matrices
+            were always double precision (`np.float64`).
+
     See Also
     --------
     sklearn.neighbors.NearestNeighbors
@@ -145,6 +194,16 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
     -----
     This function caches at level 30.
 
+    The cost of this function is dominated by the nearest-neighbor search,
+    which is compute-bound.
+    For long inputs (at least 2000 frames) in low dimension (at most 8 features),
+    a tree-based search (`sklearn.neighbors.KDTree` or `sklearn.neighbors.BallTree`)
+    is used, provided that the metric is supported by `sklearn.neighbors.BallTree`
+    or is `'cosine'`.
+    Otherwise, the search algorithm is selected by `sklearn.neighbors.NearestNeighbors`.
+    For `metric='cosine'`, this implies brute-force search, which evaluates all
+    `t^2` pairwise distances.
+
     Examples
     --------
     Find nearest neighbors in MFCC space
@@ -216,11 +275,48 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
 
     k = int(k)
 
+    if _strategy == 'auto':
+        _strategy = _choose_strategy(t, data.shape[1], metric=metric)
+
+    if _strategy not in ('brute', 'tree'):
+        raise ParameterError('Invalid neighbor search strategy: {}'.format(_strategy))
+
+    if (_strategy == 'tree' and metric != 'cosine' and
+            metric not in sklearn.neighbors.BallTree.valid_metrics):
+        raise ParameterError('Tree-based neighbor search does not support '
+                             'metric={}'.format(metric))
+
+    # Cosine distance ranks neighbors identically to euclidean distance on
+    # L2-normalized data, since ||x - y||^2 = 2 * (1 - x.y) when ||x|| = ||y|| = 1.
+    # This lets us use a tree-based search instead of brute force.
+    #
+    # Frames with zero norm are at cosine distance 1 from everything,
+    # which has no euclidean equivalent, so they require brute force.
+    cosine = False
+    if metric == 'cosine' and _strategy == 'tree':
+        data_norm = sklearn.preprocessing.normalize(data, norm='l2', axis=1)
+        if np.all(np.any(data_norm, axis=1)):
+            cosine = True
+            data = data_norm
+            metric = 'euclidean'
+        else:
+            _strategy = 'brute'
+
+    if _strategy == 'tree':
+        # kd-trees are faster in low dimension, but support fewer metrics
+        if metric in sklearn.neighbors.KDTree.valid_metrics:
+            algorithm = 'kd_tree'
+        else:
+            algorithm = 'ball_tree'
+    else:
+        # Otherwise, leave the choice of search algorithm to sklearn
+        algorithm = 'auto'
+
     # Build the neighbor search object
     try:
         knn = sklearn.neighbors.NearestNeighbors(n_neighbors=min(t-1, k + 2 * width),
                                                  metric=metric,
-                                                 algorithm='auto')
+                                                 algorithm=algorithm)
     except ValueError:
         knn = sklearn.neighbors.NearestNeighbors(n_neighbors=min(t-1, k + 2 * width),
                                                  metric=metric,
@@ -228,59 +324,79 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
 
     knn.fit(data)
 
-    # Get the knn graph
-    if mode == 'affinity':
-        kng_mode = 'distance'
-    else:
-        kng_mode = mode
-
-    rec = knn.kneighbors_graph(mode=kng_mode).tolil()
-
-    # Remove connections within width
-    for diag in range(-width + 1, width):
-        rec.setdiag(0, diag)
+    # Get the neighbors of each point, ordered by increasing distance
+    distances, neighbors = knn.kneighbors()
 
-    # Retain only the top-k links per point
-    for i in range(t):
-        # Get the links from point i
-        links = rec[i].nonzero()[1]
+    # Remove connections within width, and retain only the top-k links per point.
+    # Zero-distance links cannot be represented sparsely, so they are dropped
+    # unless we only need connectivity.
+    links = np.zeros(neighbors.shape, dtype=np.bool)
+    __select_links(neighbors, distances, k, width, mode != 'connectivity', links)
 
-        # Order them ascending
-        idx = links[np.argsort(rec[i, links].toarray())][0]
-
-        # Everything past the kth closest gets squashed
-        rec[i, idx[k:]] = 0
-
-    if self:
-        if mode == 'connectivity':
-            rec.setdiag(1)
-        elif mode == 'affinity':
-            # we need to keep the self-loop in here, but not mess up the
-            # bandwidth estimation
-            #
-            # using negative distances here preserves the structure without changing
-            # the statistics of the data
-            rec.setdiag(-1)
+    if mode == 'connectivity':
+        values = np.ones_like(distances)
+    else:
+        values = distances
+
+        if cosine:
+            # Map normalized euclidean distance back to cosine distance
+            values = 0.5 * values**2
+
+    rows, cols = np.nonzero(links)
+    values = values[rows, cols]
+    cols = neighbors[rows, cols]
+
+    if self and mode != 'distance':
+        # Self-links are assembled along with the neighbor links, so that
+        # the sparsity structure never has to be modified after construction.
+        #
+        # In affinity mode, we need to keep the self-loop in here, but not
+        # mess up the bandwidth estimation:
+        # using negative distances here preserves the structure without changing
+        # the statistics of the data
+        diag = np.arange(t)
+        rows = np.concatenate([rows, diag])
+        cols = np.concatenate([cols, diag])
+        values = np.concatenate([values,
+                                 np.full(t, 1 if mode == 'connectivity' else -1, dtype=values.dtype)])
+
+    rec = scipy.sparse.csr_matrix((values, (rows, cols)), shape=(t, t))
 
     # symmetrize
     if sym:
-        # Note: this operation produces a CSR (compressed sparse row) matrix!
         # This is why we have to do it after filling the diagonal in self-mode
         rec = rec.minimum(rec.T)
 
-    rec = rec.tocsr()
     rec.eliminate_zeros()
 
     if mode == 'connectivity':
+        if not sparse:
+            # Write the links directly into a dense boolean array,
+            # skipping the intermediate boolean sparse matrix
+            rec_dense = np.zeros((t, t), dtype=np.bool)
+            rec_dense[rec.nonzero()] = True
+            return rec_dense
+
         rec = rec.astype(np.bool)
     elif mode == 'affinity':
         if bandwidth is None:
-            bandwidth = np.nanmedian(rec.max(axis=1).data)
+            # Use the median distance to the furthest retained neighbor.
+            # Row maxima are reduced directly over the CSR data;
+            # self-links are negative at this point, and do not count.
+            nonempty = np.flatnonzero(np.diff(rec.indptr))
+            row_max = np.maximum.reduceat(rec.data, rec.indptr[nonempty])
+            bandwidth = np.nanmedian(row_max[row_max > 0])
         # Set all the negatives back to 0
         # Negatives are temporarily inserted above to preserve the sparsity structure
         # of the matrix without corrupting the bandwidth calculations
-        rec.data[rec.data < 0] = 0.0
-        rec.data[:] = np.exp(rec.data / (-1 * bandwidth))
+        np.maximum(rec.data, 0.0, out=rec.data)
+
+        # Map distances to affinities in-place
+        np.multiply(rec.data, -1.0 / bandwidth, out=rec.data)
+        np.exp(rec.data, out=rec.data)
+
+    if mode != 'connectivity':
+        rec = rec.astype(dtype, copy=False)
 
     if not sparse:
         rec = rec.toarray()
@@ -288,6 +404,49 @@ def recurrence_matrix(data, k=None, width=1, metric='euclidean',
     return rec
 
 
+@jit(nopython=True, cache=True)
+def __select_links(neighbors, distances, k, width, drop_zeros, links):  # pragma: no cover
+    '''Select the links to retain in a recurrence matrix.
+
+    Since neighbors are ordered by increasing distance, the top-k links
+    of each point are its first `k` neighbors which lie outside the width band.
+
+    Parameters
+    ----------
+    neighbors : np.ndarray [shape=(t, n_neighbors), dtype=int]
+        Neighbor indices of each point, as computed by `kneighbors`
+
+    distances : np.ndarray [shape=(t, n_neighbors)]
+        Distances to each neighbor
+
+    k : int >= 0
+        Maximum number of links per point
+
+    width : int >= 1
+        Only link neighbors `i` and `j` if `|i - j| >= width`
+
+    drop_zeros : bool
+        If true, zero-distance neighbors are not linked
+
+    links : np.ndarray [shape=(t, n_neighbors), dtype=bool]
+        Output array, which must be initialized to `False`
+    '''
+    for i in range(neighbors.shape[0]):
+        n_links = 0
+        for j in range(neighbors.shape[1]):
+            if n_links >= k:
+                break
+
+            if abs(neighbors[i, j] - i) < width:
+                continue
+
+            if drop_zeros and not distances[i, j] > 0:
+                continue
+
+            links[i, j] = True
+            n_links += 1
+
+
 def recurrence_to_lag(rec, pad=True, axis=-1):
     '''Convert a recurrence matrix into a lag matrix.
 
@@ -352,40 +511,44 @@ def recurrence_to_lag(rec, pad=True, axis=-1):
 
     sparse = scipy.sparse.issparse(rec)
 
-    roll_ax = None
-    if sparse:
-        roll_ax = 1 - axis
-        lag_format = rec.format
-        if axis == 0:
-            rec = rec.tocsc()
-        elif axis in (-1, 1):
-            rec = rec.tocsr()
-
     t = rec.shape[axis]
 
     if sparse:
+        # Shifting each time slice is a pure coordinate transformation:
+        # the lag of each entry is its offset from the time index
+        rec_coo = rec.tocoo()
+        coords = [rec_coo.row, rec_coo.col]
+        shape = [t, t]
         if pad:
-            kron = np.asarray([[1, 0]]).swapaxes(axis, 0)
-            lag = scipy.sparse.kron(kron.astype(rec.dtype), rec, format='lil')
-        else:
-            lag = scipy.sparse.lil_matrix(rec)
-    else:
-        if pad:
-            padding = [(0, 0), (0, 0)]
-            padding[(1-axis)] = (0, t)
-            lag = np.pad(rec, padding, mode='constant')
-        else:
-            lag = rec.copy()
+            shape[1 - axis] = 2 * t
 
-    idx_slice = [slice(None)] * lag.ndim
+        coords[1 - axis] = np.mod(coords[1 - axis] - coords[axis], shape[1 - axis])
 
-    for i in range(1, t):
-        idx_slice[axis] = i
-        lag[tuple(idx_slice)] = util.roll_sparse(lag[tuple(idx_slice)], -i, axis=roll_ax)
+        lag = scipy.sparse.coo_matrix((rec_coo.data, tuple(coords)), shape=tuple(shape))
+        return lag.asformat(rec.format)
 
-    if sparse:
-        return lag.asformat(lag_format)
-    return np.ascontiguousarray(lag.T).T
+    # Work with time on the columns: for axis=0, this is a transposed view
+    if axis == 0:
+        rec = rec.T
+
+    n_lag = 2 * t if pad else t
+
+    # Allocate the output once, so that each time slice is contiguous
+    if pad:
+        lag = np.zeros((n_lag, t), dtype=rec.dtype, order='F')
+    else:
+        lag = np.empty((n_lag, t), dtype=rec.dtype, order='F')
+
+    # lag[i, j] = rec[(i + j) mod n_lag, j], or 0 in the padding.
+    # Each time slice is filled by two copies from rec:
+    # the lags with i + j < t, and the lags which wrap around.
+    for j in range(t):
+        lag[:t - j, j] = rec[j:, j]
+        lag[n_lag - j:, j] = rec[:j, j]
+
+    if axis == 0:
+        return lag.T
+    return lag
 
 
 def lag_to_recurrence(lag, axis=-1):
@@ -455,26 +618,37 @@ def lag_to_recurrence(lag, axis=-1):
     # Since lag must be 2-dimensional, abs(axis) = axis
     t = lag.shape[axis]
 
-    sparse = scipy.sparse.issparse(lag)
-    if sparse:
-        rec = scipy.sparse.lil_matrix(lag)
-        roll_ax = 1 - axis
-    else:
-        rec = lag.copy()
-        roll_ax = None
+    if scipy.sparse.issparse(lag):
+        # Undo the lag shift by coordinate transformation,
+        # discarding anything that lands in the padding
+        lag_coo = lag.tocoo()
+        coords = [lag_coo.row, lag_coo.col]
+        coords[1 - axis] = np.mod(coords[1 - axis] + coords[axis], lag.shape[1 - axis])
+
+        keep = coords[1 - axis] < t
+        rec = scipy.sparse.coo_matrix((lag_coo.data[keep],
+                                       (coords[0][keep], coords[1][keep])),
+                                      shape=(t, t))
+        return rec.asformat(lag.format)
 
-    idx_slice = [slice(None)] * lag.ndim
-    for i in range(1, t):
-        idx_slice[axis] = i
-        rec[tuple(idx_slice)] = util.roll_sparse(lag[tuple(idx_slice)], i, axis=roll_ax)
+    # Work with time on the columns: for axis=0, this is a transposed view
+    if axis == 0:
+        lag = lag.T
 
-    sub_slice = [slice(None)] * rec.ndim
-    sub_slice[1 - axis] = slice(t)
-    rec = rec[tuple(sub_slice)]
+    n_lag = lag.shape[0]
 
-    if sparse:
-        return rec.asformat(lag.format)
-    return np.ascontiguousarray(rec.T).T
+    # Allocate the output once, so that each time slice is contiguous
+    rec = np.empty((t, t), dtype=lag.dtype, order='F')
+
+    # rec[i, j] = lag[(i - j) mod n_lag, j]
+    # Each time slice is filled by two copies from lag, skipping the padding.
+    for j in range(t):
+        rec[j:, j] = lag[:t - j, j]
+        rec[:j, j] = lag[n_lag - j:, j]
+
+    if axis == 0:
+        return rec.T
+    return rec
 
 
 def timelag_filter(function, pad=True, index=0):
@@ -653,11 +827,11 @@ def subsegment(data, frames, n_segments=4, axis=-1):
 
     for seg_start, seg_end in zip(frames[:-1], frames[1:]):
         idx_slices[axis] = slice(seg_start, seg_end)
-        boundaries.extend(seg_start + agglomerative(data[tuple(idx_slices)],
+        boundaries.append(seg_start + agglomerative(data[tuple(idx_slices)],
                                                     min(seg_end - seg_start, n_segments),
                                                     axis=axis))
 
-    return np.ascontiguousarray(boundaries)
+    return np.concatenate(boundaries)
 
 
 def agglomerative(data, k, clusterer=None, axis=-1):
@@ -733,8 +907,7 @@ def agglomerative(data, k, clusterer=None, axis=-1):
 
     if clusterer is None:
         # Connect the temporal connectivity graph
-        grid = sklearn.feature_extraction.image.grid_to_graph(n_x=n,
-                                                              n_y=1, n_z=1)
+        grid = _chain_graph(n).copy()
 
         # Instantiate the clustering object
         clusterer = sklearn.cluster.AgglomerativeClustering(n_clusters=k,
@@ -745,14 +918,29 @@ def agglomerative(data, k, clusterer=None, axis=-1):
     clusterer.fit(data)
 
     # Find the change points from the labels
-    boundaries = [0]
-    boundaries.extend(
-        list(1 + np.nonzero(np.diff(clusterer.labels_))[0].astype(int)))
-    return np.asarray(boundaries)
+    change_points = np.flatnonzero(np.diff(clusterer.labels_))
+
+    boundaries = np.empty(len(change_points) + 1, dtype=int)
+    boundaries[0] = 0
+    boundaries[1:] = change_points + 1
+    return boundaries
+
+
+@lru_cache(maxsize=128)
+def _chain_graph(n):
+    '''Construct the temporal connectivity graph over `n` frames.
+
+    The graph depends only on `n`, so it is memoized: `subsegment`
+    clusters many intervals of the same length.
+    Callers should copy the result before handing it to code which
+    may modify it.
+    '''
+    return sklearn.feature_extraction.image.grid_to_graph(n_x=n, n_y=1, n_z=1)
 
 
 def path_enhance(R, n, window='hann', max_ratio=2.0, min_ratio=None, n_filters=7,
-                 zero_mean=False, clip=True, **kwargs):
+                 zero_mean=False, clip=True, symmetric=False, n_jobs=-1, _strategy='auto',
+                 **kwargs):
     '''Multi-angle path enhancement for self- and cross-similarity matrices.
 
     This function convolves multiple diagonal smoothing filters with a self-similarity (or
@@ -823,9 +1011,30 @@ def path_enhance(R, n, window='hann', max_ratio=2.0, min_ratio=None, n_filters=7
         If True, the smoothed similarity matrix will be thresholded at 0, and will not contain
         negative entries.
 
+    symmetric : bool
+        If True, `R` is assumed to be symmetric (e.g., a self-similarity matrix).
+
+        Filters at tempo ratios `r` and `1/r` then produce transposed responses,
+        so only one of each such pair is convolved with `R`.  With the default
+        `min_ratio`, this nearly halves the number of convolutions.
+
+    n_jobs : int
+        The maximum number of threads used to apply the filters directly.
+        If negative, it counts back from the number of available CPUs,
+        so that `n_jobs=-1` uses all of them.
+
+        Each thread holds up to two arrays the size of `R`, so memory usage
+        grows with the number of threads, up to `n_filters` copies of `R`.
+        Set `n_jobs=1` to apply all filters in the calling thread,
+        which holds at most two copies of `R` at a time.
+
     kwargs : additional keyword arguments
         Additional arguments to pass to `scipy.ndimage.convolve`
 
+        If no arguments other than `mode` or `cval` are given, and `R`
+        contains only finite values, the equivalent convolutions may be
+        computed more efficiently in the frequency domain (see Notes).
+
 
     Returns
     -------
@@ -837,6 +1046,14 @@ def path_enhance(R, n, window='hann', max_ratio=2.0, min_ratio=None, n_filters=7
     filters.diagonal_filter
     recurrence_matrix
 
+    Notes
+    -----
+    The cost of this function is dominated by the convolutions, which are
+    memory-bound: each filter response covers all of `R`.
+    When the filters are long relative to `log(R.size)`, the convolutions are
+    computed in the frequency domain, so that `R` is transformed only once.
+    Otherwise, each filter is applied directly by `scipy.ndimage.convolve`.
+
 
     Examples
     --------
@@ -866,19 +1083,243 @@ def path_enhance(R, n, window='hann', max_ratio=2.0, min_ratio=None, n_filters=7
     elif min_ratio > max_ratio:
         raise ParameterError('min_ratio={} cannot exceed max_ratio={}'.format(min_ratio, max_ratio))
 
-    R_smooth = None
-    for ratio in np.logspace(np.log2(min_ratio), np.log2(max_ratio), num=n_filters, base=2):
-        kernel = diagonal_filter(window, n, slope=ratio, zero_mean=zero_mean)
+    if _strategy not in ('auto', 'brute', 'fft'):
+        raise ParameterError('Invalid convolution strategy: {}'.format(_strategy))
 
-        if R_smooth is None:
-            R_smooth = scipy.ndimage.convolve(R, kernel, **kwargs)
-        else:
-            # Compute the point-wise maximum in-place
-            np.maximum(R_smooth, scipy.ndimage.convolve(R, kernel, **kwargs),
-                       out=R_smooth)
+    kernel_params = (window, n, min_ratio, max_ratio, n_filters, zero_mean)
+    try:
+        hash(kernel_params)
+    except TypeError:
+        # Unhashable window specifications (e.g., arrays) cannot be cached
+        kernels = __build_path_enhance_kernels(*kernel_params)
+    else:
+        kernels = _path_enhance_kernels(*kernel_params)
+
+    if symmetric:
+        if R.ndim != 2 or R.shape[0] != R.shape[1]:
+            raise ParameterError('symmetric=True requires a square matrix, '
+                                 'but R.shape={}'.format(R.shape))
+
+        # For symmetric R, the response to the filter at ratio 1/r is the
+        # transpose of the response at ratio r.  When both appear in the bank,
+        # we only convolve with the filter at r > 1, and recover the other
+        # response by transposition.
+        ratios = np.logspace(np.log2(min_ratio), np.log2(max_ratio), num=n_filters, base=2)
+        paired = (np.isclose(1. / ratios[:, np.newaxis], ratios).any(axis=1) &
+                  ~np.isclose(ratios, 1))
+
+        mirrored = [kernel for kernel, ratio, pair in zip(kernels, ratios, paired) if pair and ratio > 1]
+        unpaired = [kernel for kernel, pair in zip(kernels, paired) if not pair]
+
+        R_smooth = None
+        if mirrored:
+            R_smooth = __convolve_max(R, mirrored, n_jobs, _strategy, **kwargs)
+            R_smooth = np.maximum(R_smooth, R_smooth.T)
+
+        if unpaired:
+            R_unpaired = __convolve_max(R, unpaired, n_jobs, _strategy, **kwargs)
+            if R_smooth is None:
+                R_smooth = R_unpaired
+            else:
+                np.maximum(R_smooth, R_unpaired, out=R_smooth)
+    else:
+        R_smooth = __convolve_max(R, kernels, n_jobs, _strategy, **kwargs)
 
     if clip:
         # Clip the output in-place
         np.clip(R_smooth, 0, None, out=R_smooth)
 
     return R_smooth
+
+
+def __convolve_max(R, kernels, n_jobs, strategy, **kwargs):
+    '''Compute the point-wise maximum of `R` convolved with each of a (non-empty) bank of kernels'''
+    if strategy == 'auto':
+        strategy = _choose_strategy(R.size, max(kernel.size for kernel in kernels))
+
+    if strategy == 'fft' and __fft_compatible(R, kernels, kwargs):
+        # Transform R once, and convolve each kernel in the frequency domain
+        R_smooth = np.empty_like(R)
+        R_smooth.fill(-np.inf)
+        for R_conv in __convolve_fft(R, kernels, **kwargs):
+            # Compute the point-wise maximum in-place
+            np.maximum(R_smooth, R_conv, out=R_smooth)
+            # Release each response before the next one is computed
+            del R_conv
+
+    else:
+        if n_jobs < 0:
+            n_jobs = max(1, cpu_count() + 1 + n_jobs)
+
+        n_groups = min(n_jobs, len(kernels))
+
+        if n_groups > 1 and 'output' not in kwargs:
+            # ndimage releases the GIL, so kernels can be convolved in parallel threads.
+            # Each thread reduces its own group of kernels, so that only one
+            # accumulator (and one buffer) per thread is held in memory.
+            groups = [kernels[i::n_groups] for i in range(n_groups)]
+            convolutions = Parallel(n_jobs=n_groups, prefer='threads')(
+                delayed(__convolve_max_direct)(R, group, **kwargs) for group in groups)
+
+            R_smooth = convolutions.pop(0)
+            while convolutions:
+                np.maximum(R_smooth, convolutions.pop(), out=R_smooth)
+        else:
+            R_smooth = __convolve_max_direct(R, kernels, **kwargs)
+
+    return R_smooth
+
+
+def __convolve_max_direct(R, kernels, **kwargs):
+    '''Compute the point-wise maximum of `R` convolved with each of a (non-empty)
+    bank of kernels by `scipy.ndimage.convolve`, in the calling thread'''
+    R_smooth = scipy.ndimage.convolve(R, kernels[0], **kwargs)
+
+    if len(kernels) > 1:
+        # Reuse a single buffer for the remaining filter responses
+        R_conv = np.empty_like(R_smooth)
+        kwargs['output'] = R_conv
+        for kernel in kernels[1:]:
+            scipy.ndimage.convolve(R, kernel, **kwargs)
+            np.maximum(R_smooth, R_conv, out=R_smooth)
+
+    return R_smooth
+
+
+def _choose_strategy(n, d, metric=None):
+    '''Choose how to evaluate the dominant computation of
+    `recurrence_matrix` (neighbor search) or `path_enhance` (convolution).
+
+    Parameters
+    ----------
+    n : int > 0
+        For neighbor search, the number of frames.
+        For convolution, the number of entries in the input matrix.
+
+    d : int > 0
+        For neighbor search, the number of features.
+        For convolution, the number of taps in the largest kernel.
+
+    metric : str or None
+        The neighbor search metric, or `None` for convolution.
+
+    Returns
+    -------
+    strategy : str
+        - `'brute'` : brute-force neighbor search, or direct convolution
+        - `'tree'` : tree-based neighbor search
+        - `'fft'` : frequency-domain convolution
+    '''
+    if metric is None:
+        # Direct convolution costs d operations per output,
+        # frequency-domain convolution costs O(log n)
+        if d > __FFT_MIN_TAPS_RATIO * np.log2(n):
+            return 'fft'
+        return 'brute'
+
+    if metric != 'cosine' and metric not in sklearn.neighbors.BallTree.valid_metrics:
+        return 'brute'
+
+    if n >= __TREE_MIN_FRAMES and d <= __TREE_MAX_DIM:
+        return 'tree'
+    return 'brute'
+
+
+def __build_path_enhance_kernels(window, n, min_ratio, max_ratio, n_filters, zero_mean):
+    '''Construct the bank of diagonal smoothing filters used by `path_enhance`.
+
+    Kernels are marked read-only, so that they can be safely shared
+    between calls.
+    '''
+    kernels = []
+    for ratio in np.logspace(np.log2(min_ratio), np.log2(max_ratio), num=n_filters, base=2):
+        kernel = diagonal_filter(window, n, slope=ratio, zero_mean=zero_mean)
+        kernel.setflags(write=False)
+        kernels.append(kernel)
+
+    return tuple(kernels)
+
+
+# Kernel banks are deterministic in their parameters, so we memoize them
+_path_enhance_kernels = lru_cache(maxsize=32)(__build_path_enhance_kernels)
+
+
+def __fft_compatible(R, kernels, kwargs):
+    '''Check whether `__convolve_fft` can stand in for `scipy.ndimage.convolve`'''
+    if not set(kwargs).issubset(['mode', 'cval']):
+        return False
+
+    if kwargs.get('mode', 'reflect') not in __PAD_MODES:
+        return False
+
+    if R.ndim != 2 or not np.issubdtype(R.dtype, np.floating):
+        return False
+
+    # Non-finite values would spread across the entire output in the frequency domain
+    if not np.all(np.isfinite(R)):
+        return False
+
+    # Boundary extension must not exceed the extent of R
+    return all(np.all(np.less_equal(kernel.shape, R.shape)) for kernel in kernels)
+
+
+def __convolve_fft(R, kernels, mode='reflect', cval=0.0):
+    '''Convolve `R` with each of a bank of kernels in the frequency domain.
+
+    This is equivalent to `scipy.ndimage.convolve(R, kernel, mode=mode, cval=cval)`
+    for each kernel, but `R` is padded and transformed only once.
+
+    Parameters
+    ----------
+    R : np.ndarray, ndim=2
+        The input matrix
+
+    kernels : iterable of np.ndarray, ndim=2
+        The kernels to convolve with `R`
+
+    mode : str
+        The boundary mode, as in `scipy.ndimage.convolve`
+
+    cval : float
+        The fill value for `mode='constant'`
+
+    Yields
+    ------
+    R_conv : np.ndarray, shape=R.shape
+        The convolution of `R` with each kernel, in order.
+        This is a view into a temporary buffer, and its precision may differ from `R`.
+    '''
+    fft = core.get_fftlib()
+
+    shapes = np.asarray([kernel.shape for kernel in kernels])
+    centers = shapes // 2
+
+    # Pad enough to support the largest kernel on either side
+    pad_before = np.max(shapes - 1 - centers, axis=0)
+    pad_after = np.max(centers, axis=0)
+
+    pad_kwargs = dict()
+    if mode == 'constant':
+        pad_kwargs['constant_values'] = cval
+
+    R_pad = np.pad(R, list(zip(pad_before, pad_after)),
+                   mode=__PAD_MODES[mode], **pad_kwargs)
+
+    # The padding already guards the output region against circular wrap-around
+    fft_shape = [scipy.fftpack.next_fast_len(int(_)) for _ in R_pad.shape]
+
+    R_fft = fft.rfft2(R_pad, s=fft_shape)
+    del R_pad
+
+    for kernel, center in zip(kernels, centers):
+        # Multiply spectra in-place, so that each kernel needs only one complex buffer
+        K_fft = fft.rfft2(kernel, s=fft_shape)
+        K_fft *= R_fft
+
+        # Invert one axis at a time, so that each spectrum is released
+        # as soon as it has been consumed
+        K_fft = fft.ifft(K_fft, axis=0)
+
+        start = center + pad_before
+        yield fft.irfft(K_fft, n=fft_shape[1], axis=1)[start[0]:start[0] + R.shape[0],
+                                                       start[1]:start[1] + R.shape[1]]
@@ -106,6 +106,85 @@ def test_recurrence_distance(self):
     assert np.allclose(rec.diagonal(), 0.0)
 
 
+@pytest.mark.parametrize('n_features', [3, 50])
+def test_recurrence_cosine(n_features):
+
+    srand()
+    data = np.random.randn(n_features, 100)
+    distance = squareform(pdist(data.T, metric='cosine'))
+    rec = librosa.segment.recurrence_matrix(data, mode='distance',
+                                            metric='cosine', sparse=True)
+
+    i, j, vals = scipy.sparse.find(rec)
+    assert np.allclose(vals, distance[i, j])
+
+
+@pytest.mark.parametrize('metric', ['euclidean', 'cosine'])
+def test_recurrence_strategy(metric):
+
+    srand()
+    data = np.random.randn(3, 100)
+    rec_tree = librosa.segment.recurrence_matrix(data, mode='distance', metric=metric,
+                                                 _strategy='tree')
+    rec_brute = librosa.segment.recurrence_matrix(data, mode='distance', metric=metric,
+                                                  _strategy='brute')
+
+    assert np.allclose(rec_tree, rec_brute)
+
+
+@pytest.mark.parametrize('metric', ['euclidean', 'cosine'])
+def test_recurrence_connectivity_nearest(metric):
+
+    # Without duplicate frames, connectivity links are exactly the k nearest neighbors
+    srand()
+    data = np.random.randn(12, 200)
+    rec_conn = librosa.segment.recurrence_matrix(data, metric=metric, sparse=True)
+    rec_dist = librosa.segment.recurrence_matrix(data, metric=metric, mode='distance',
+                                                 sparse=True)
+
+    assert (rec_conn != rec_dist.astype(np.bool)).nnz == 0
+
+
+def test_recurrence_cosine_zeros():
+
+    # Zero-norm frames must not be mapped onto the unit sphere
+    srand()
+    data = np.abs(np.random.randn(4, 60))
+    data[:, 10:20] = 0
+    rec_tree = librosa.segment.recurrence_matrix(data, mode='distance', metric='cosine',
+                                                 _strategy='tree')
+    rec_brute = librosa.segment.recurrence_matrix(data, mode='distance', metric='cosine',
+                                                  _strategy='brute')
+
+    assert np.allclose(rec_tree, rec_brute)
+
+
+@pytest.mark.xfail(raises=librosa.ParameterError)
+def test_recurrence_badstrategy():
+    librosa.segment.recurrence_matrix(np.random.randn(3, 100), _strategy='fft')
+
+
+@pytest.mark.xfail(raises=librosa.ParameterError)
+def test_recurrence_badstrategy_metric():
+    librosa.segment.recurrence_matrix(np.random.randn(3, 100), metric='correlation',
+                                      _strategy='tree')
+
+
+@pytest.mark.parametrize('mode', ['connectivity', 'distance', 'affinity'])
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_recurrence_dtype(mode, sparse, dtype):
+
+    srand()
+    data = np.random.randn(3, 100)
+    rec = librosa.segment.recurrence_matrix(data, mode=mode, sparse=sparse, dtype=dtype)
+
+    if mode == 'connectivity':
+        assert rec.dtype == np.bool_
+    else:
+        assert rec.dtype == dtype
+
+
 def test_recurrence_affinity():
 
     def __test(metric, bandwidth, self):
@@ -370,3 +449,75 @@ def test_path_enhance(R_input, window, n, max_ratio, min_ratio,
 
     if clip:
         assert np.min(R_smooth) >= 0
+
+
+def test_path_enhance_array_window(R_input):
+
+    # Array-valued windows bypass the kernel cache, but must match
+    # the equivalent named window
+    R_named = librosa.segment.path_enhance(R_input, 5, window='hann')
+    R_array = librosa.segment.path_enhance(R_input, 5,
+                                           window=scipy.signal.get_window('hann', 5, fftbins=False))
+
+    assert np.allclose(R_named, R_array)
+
+
+@pytest.mark.parametrize('mode', ['reflect', 'mirror', 'nearest', 'wrap', 'constant'])
+@pytest.mark.parametrize('n', [4, 9])
+def test_path_enhance_fft(R_input, mode, n):
+
+    R_fft = librosa.segment.path_enhance(R_input, n, clip=False, mode=mode, cval=0.5,
+                                         _strategy='fft')
+    R_direct = librosa.segment.path_enhance(R_input, n, clip=False, mode=mode, cval=0.5,
+                                            _strategy='brute')
+
+    assert np.allclose(R_fft, R_direct)
+
+
+def test_path_enhance_fft_nonfinite():
+
+    # Non-finite values must only affect the support of each kernel
+    srand()
+    R = np.random.randn(30, 30)
+    R[10, 10] = np.nan
+    R_fft = librosa.segment.path_enhance(R, 21, clip=False, _strategy='fft')
+    R_direct = librosa.segment.path_enhance(R, 21, clip=False, _strategy='brute')
+
+    assert np.any(np.isfinite(R_fft))
+    assert np.allclose(R_fft, R_direct, equal_nan=True)
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3, -1])
+def test_path_enhance_n_jobs(R_input, n_jobs):
+
+    R_serial = librosa.segment.path_enhance(R_input, 5, n_filters=5, clip=False,
+                                            n_jobs=1, _strategy='brute')
+    R_threads = librosa.segment.path_enhance(R_input, 5, n_filters=5, clip=False,
+                                             n_jobs=n_jobs, _strategy='brute')
+
+    assert np.allclose(R_serial, R_threads)
+
+
+@pytest.mark.xfail(raises=librosa.ParameterError)
+def test_path_enhance_badstrategy(R_input):
+    librosa.segment.path_enhance(R_input, 5, _strategy='tree')
+
+
+@pytest.mark.parametrize('min_ratio', [None, 1.0, 0.75])
+@pytest.mark.parametrize('n_filters', [1, 2, 5])
+@pytest.mark.parametrize('kwargs', [dict(), dict(origin=0)])
+def test_path_enhance_symmetric(R_input, min_ratio, n_filters, kwargs):
+
+    R_full = librosa.segment.path_enhance(R_input, 5, min_ratio=min_ratio,
+                                          n_filters=n_filters, clip=False, **kwargs)
+    R_sym = librosa.segment.path_enhance(R_input, 5, min_ratio=min_ratio,
+                                         n_filters=n_filters, clip=False,
+                                         symmetric=True, **kwargs)
+
+    assert np.allclose(R_full, R_sym)
+
+
+@pytest.mark.xfail(raises=librosa.ParameterError)
+def test_path_enhance_symmetric_badshape():
+
+    librosa.segment.path_enhance(np.ones((10, 12)), 5, symmetric=True)